@@ -1,344 +1,553 @@
+import glob
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import hashlib
+import plotly
 import plotly.express as px
+import plotly.io as pio
 import dash
 from dash import html, dcc
 
 # ---- Data loading & preprocessing ----
 # Adjust the path if your CSV is in another folder
-df = pd.read_csv("athlete_events.csv")
-
-# Fill missing numeric values with median
-df = df.fillna({
-    "Age": df["Age"].median(),
-    "Height": df["Height"].median(),
-    "Weight": df["Weight"].median(),
-})
-
-# Optimise some dtypes (optional)
-df = df.astype({
-    "Age": "uint8",
-    "Height": "uint8",
-    "Weight": "uint8",
+DATA_CSV = "athlete_events.csv"
+DATA_PARQUET = "athlete_events.parquet"
+
+# Only the columns the figures use (Team and City are never parsed)
+COLUMNS = [
+    "ID", "Name", "Sex", "Age", "Height", "Weight", "NOC",
+    "Games", "Year", "Season", "Sport", "Event", "Medal",
+]
+
+# Parse compact dtypes up front; low-cardinality text columns become
+# categoricals so filters and groupbys work on integer codes, and the
+# free-text Name column is Arrow-backed so it factorizes in pyarrow
+DTYPES = {
     "ID": "uint32",
+    "Name": "string[pyarrow]",
     "Year": "int16",
-})
-
-# Anonymise names with SHA-256
-df["Name"] = df["Name"].apply(
-    lambda x: hashlib.sha256(str(x).encode()).hexdigest()
-)
-
-# Replace missing medals with explicit "None"
-df["Medal"] = df["Medal"].fillna("None")
-
-# Filter Italy (ITA)
-ita = df[df["NOC"] == "ITA"].copy()
-
-# ---- Figures: Italy overall ----
-
-# 1) Top 10 sports where Italy has the most medals
-ita_medals_unique = (
-    ita[ita["Medal"] != "None"]
-    .drop_duplicates(subset=["Games", "Event", "Medal"])
-)
-
-medals_by_sport = (
-    ita_medals_unique
-    .groupby("Sport")["Medal"]
-    .count()
-    .sort_values(ascending=False)
-)
-
-fig_medals_by_sport = px.bar(
-    medals_by_sport.head(10),
-    title="Top 10 sporter där Italien tagit flest medaljer",
-    labels={"index": "Sport", "value": "Antal medaljer"},
-)
-
-# 2) Top 5 sports with most Italian participants
-participants_by_sport = (
-    ita
-    .drop_duplicates(subset=["Games", "ID"])
-    .groupby("Sport")["ID"]
-    .count()
-    .sort_values(ascending=False)
-)
-
-fig_participants_by_sport = px.bar(
-    participants_by_sport.head(5),
-    title="Top 5 sporter med flest italienska deltagare",
-    labels={"index": "Sport", "value": "Antal deltagare"},
-)
-
-# 3) Summer vs Winter medals over time
-# Summer
-ita_summer_unique = (
-    ita[
-        (ita["Medal"] != "None") &
-        (ita["Season"] == "Summer")
+    "Sex": "category",
+    "NOC": "category",
+    "Games": "category",
+    "Season": "category",
+    "Sport": "category",
+    "Event": "category",
+    "Medal": "category",
+}
+
+
+# ---- Helpers ----
+
+def fnv1a_64(strings):
+    """64-bit FNV-1a of each string, vectorised over byte positions."""
+    arr = pa.array(strings, type=pa.large_string())
+    # Arrow-backed pandas arrays can come back chunked; the buffer walk
+    # below needs one contiguous array
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int64)
+    offsets = offsets[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(arr.buffers()[2] or b"", dtype=np.uint8)
+
+    # Longest strings first, so the rows still hashing at byte j are a prefix
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind="stable")
+    starts = offsets[:-1][order]
+    neg_lengths = -lengths[order]
+
+    hashes = np.full(len(arr), 14695981039346656037, dtype=np.uint64)
+    prime = np.uint64(1099511628211)
+    for j in range(-int(neg_lengths[0]) if len(arr) else 0):
+        live = np.searchsorted(neg_lengths, -j)
+        hashes[:live] ^= data[starts[:live] + j]
+        hashes[:live] *= prime
+
+    out = np.empty_like(hashes)
+    out[order] = hashes
+    return out
+
+
+def parquet_is_stale():
+    """True if the Parquet copy is missing or older than the CSV."""
+    try:
+        return os.path.getmtime(DATA_PARQUET) < os.path.getmtime(DATA_CSV)
+    except FileNotFoundError:
+        return True
+
+
+def category_counts(values, name):
+    """Count rows per observed category, in category order."""
+    codes, counts = np.unique(values.cat.codes.to_numpy(), return_counts=True)
+    return pd.Series(
+        counts,
+        index=pd.Index(values.cat.categories[codes], name=values.name),
+        name=name,
+    )
+
+
+# ---- Figure cache ----
+# Built figures are stored as JSON keyed by the data file they were built
+# from, this script and plotly, so unchanged restarts reload them instead
+# of rerunning plotly.express
+FIG_CACHE_DIR = ".cache"
+
+
+def fig_cache_key(data_path):
+    """Key for figures built from data_path (CSV or Parquet copy)."""
+    key = hashlib.blake2b(digest_size=8)
+    with open(data_path, "rb") as f:
+        key.update(f.read(4096))
+    stat = os.stat(data_path)
+    key.update(f"{data_path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    key.update(plotly.__version__.encode())
+    with open(__file__, "rb") as f:
+        key.update(f.read())
+    return key.hexdigest()
+
+
+def cached_fig(name, key):
+    """Replace the decorated builder with its figure, cached on disk."""
+    def decorator(build):
+        path = os.path.join(FIG_CACHE_DIR, f"{name}-{key}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return pio.from_json(f.read())
+        except FileNotFoundError:
+            fig = build()
+            os.makedirs(FIG_CACHE_DIR, exist_ok=True)
+            # Write then rename so a concurrent start never reads half a file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(fig.to_json())
+            os.replace(tmp_path, path)
+            # Drop this figure's entries for older keys so edits to the
+            # data or script do not grow the cache without bound
+            pattern = os.path.join(FIG_CACHE_DIR, f"{name}-*.json")
+            for old_path in glob.glob(pattern):
+                if old_path != path:
+                    try:
+                        os.remove(old_path)
+                    except FileNotFoundError:
+                        pass
+            return fig
+    return decorator
+
+
+# ---- Data preparation & figures ----
+
+def build_layout():
+    """Load and prepare the data, then build the page with every figure."""
+    # Opt-in Parquet cache (DASH_USE_PARQUET=1): parse the CSV once with the
+    # pyarrow engine, then reload the typed columnar copy on later starts.
+    # The copy is rebuilt whenever the CSV has changed since it was written.
+    if os.environ.get("DASH_USE_PARQUET") == "1":
+        data_path = DATA_PARQUET
+        if parquet_is_stale():
+            df = pd.read_csv(
+                DATA_CSV, engine="pyarrow", usecols=COLUMNS
+            ).astype(DTYPES)
+            # Write then rename so an interrupted write never leaves a
+            # truncated file behind
+            tmp_path = f"{DATA_PARQUET}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, DATA_PARQUET)
+        else:
+            df = pd.read_parquet(DATA_PARQUET, columns=COLUMNS)
+    else:
+        data_path = DATA_CSV
+        df = pd.read_csv(DATA_CSV, usecols=COLUMNS, dtype=DTYPES)
+
+    # The CSV parser merges categories chunk by chunk, so sort them to keep
+    # code order (and groupby key order) alphabetical
+    for col in df.select_dtypes("category"):
+        df[col] = df[col].cat.reorder_categories(
+            df[col].cat.categories.sort_values()
+        )
+
+    # Fill missing numeric values with median, then narrow to uint8
+    body_cols = ["Age", "Height", "Weight"]
+    df[body_cols] = (
+        df[body_cols]
+        .fillna(df[body_cols].median())
+        .astype("uint8")
+    )
+
+    # Anonymise names as 64-bit FNV-1a hashes, hashing each distinct name
+    # only once. Names are never shown, so an integer key is all we need.
+    name_codes, unique_names = pd.factorize(df["Name"], use_na_sentinel=False)
+    df["Name"] = fnv1a_64(unique_names)[name_codes]
+
+    # Replace missing medals with explicit "None" (kept categorical)
+    df["Medal"] = df["Medal"].cat.add_categories(["None"]).fillna("None")
+
+    # Row masks compared on category codes; the filtered frames are never
+    # modified, so they are not copied again
+    ita_mask = (
+        df["NOC"].cat.codes.to_numpy()
+        == df["NOC"].cat.categories.get_loc("ITA")
+    )
+    fencing_mask = (
+        df["Sport"].cat.codes.to_numpy()
+        == df["Sport"].cat.categories.get_loc("Fencing")
+    )
+
+    # Filter Italy (ITA)
+    ita = df.loc[ita_mask]
+
+    # Key the figure cache on the file the data was actually loaded from
+    cache_key = fig_cache_key(data_path)
+
+    # ---- Figures: Italy overall ----
+
+    # Unique Italian medals (team events count once); Season and Sport are
+    # fixed by Games and Event, so the subsets below can filter this directly
+    ita_medals_unique = (
+        ita[ita["Medal"] != "None"]
+        .drop_duplicates(subset=["Games", "Event", "Medal"])
+    )
+
+    # 1) Top 10 sports where Italy has the most medals
+    medals_by_sport = (
+        category_counts(ita_medals_unique["Sport"], "Medal")
+        .nlargest(10)
+    )
+
+    @cached_fig("fig_medals_by_sport", cache_key)
+    def fig_medals_by_sport():
+        return px.bar(
+            medals_by_sport,
+            title="Top 10 sporter där Italien tagit flest medaljer",
+            labels={"index": "Sport", "value": "Antal medaljer"},
+        )
+
+    # One row per athlete and Games, deduplicated on a single int64 key
+    participant_key = (
+        ita["Games"].cat.codes.astype(np.int64) * (int(ita["ID"].max()) + 1)
+        + ita["ID"].astype(np.int64)
+    )
+    ita_participants = ita.loc[
+        ~participant_key.duplicated(), ["Season", "Games", "Sport"]
     ]
-    .drop_duplicates(subset=["Games", "Event", "Medal"])
-)
-
-medals_by_games_summer = (
-    ita_summer_unique
-    .groupby("Games")["Medal"]
-    .count()
-    .reset_index()
-)
-
-fig_medals_summer = px.line(
-    medals_by_games_summer,
-    x="Games",
-    y="Medal",
-    title="Medaljer per OS - Italien Sommar",
-    markers=True,
-)
-
-# Winter
-ita_winter_unique = (
-    ita[
-        (ita["Medal"] != "None") &
-        (ita["Season"] == "Winter")
+
+    # 2) Top 5 sports with most Italian participants
+    participants_by_sport = (
+        category_counts(ita_participants["Sport"], "ID")
+        .nlargest(5)
+    )
+
+    @cached_fig("fig_participants_by_sport", cache_key)
+    def fig_participants_by_sport():
+        return px.bar(
+            participants_by_sport,
+            title="Top 5 sporter med flest italienska deltagare",
+            labels={"index": "Sport", "value": "Antal deltagare"},
+        )
+
+    # 3) Summer vs Winter medals over time (both seasons in one groupby)
+    medals_by_games = (
+        ita_medals_unique
+        .groupby(["Season", "Games"], observed=True)
+        .size()
+    )
+
+    # Summer
+    medals_by_games_summer = (
+        medals_by_games.xs("Summer")
+        .reset_index(name="Medal")
+    )
+
+    @cached_fig("fig_medals_summer", cache_key)
+    def fig_medals_summer():
+        return px.line(
+            medals_by_games_summer,
+            x="Games",
+            y="Medal",
+            title="Medaljer per OS - Italien Sommar",
+            markers=True,
+        )
+
+    # Winter
+    medals_by_games_winter = (
+        medals_by_games.xs("Winter")
+        .reset_index(name="Medal")
+    )
+
+    @cached_fig("fig_medals_winter", cache_key)
+    def fig_medals_winter():
+        return px.line(
+            medals_by_games_winter,
+            x="Games",
+            y="Medal",
+            title="Medaljer per OS - Italien Vinter",
+            markers=True,
+        )
+
+    # 4) Age distribution of Italian athletes
+
+    @cached_fig("fig_age_hist", cache_key)
+    def fig_age_hist():
+        return px.histogram(
+            ita,
+            x="Age",
+            nbins=30,
+            title="Åldersfördelning - Italienska OS-idrottare",
+            labels={"Age": "Ålder"},
+        )
+
+    # 5) Sex distribution pie chart
+
+    @cached_fig("fig_sex_pie", cache_key)
+    def fig_sex_pie():
+        return px.pie(
+            ita,
+            names="Sex",
+            title="Könsfördelning - Italien",
+        )
+
+    # 6) Number of Italian participants per Games (Summer & Winter)
+    participants_by_games = (
+        ita_participants
+        .groupby(["Season", "Games"], observed=True)
+        .size()
+    )
+
+    ita_summer_participants = (
+        participants_by_games.xs("Summer")
+        .reset_index(name="ID")
+    )
+
+    @cached_fig("fig_summer_participants", cache_key)
+    def fig_summer_participants():
+        return px.line(
+            ita_summer_participants,
+            x="Games",
+            y="ID",
+            title="Antal italienska deltagare per OS - Sommar",
+            markers=True,
+            labels={"ID": "Antal deltagare"},
+        )
+
+    ita_winter_participants = (
+        participants_by_games.xs("Winter")
+        .reset_index(name="ID")
+    )
+
+    @cached_fig("fig_winter_participants", cache_key)
+    def fig_winter_participants():
+        return px.line(
+            ita_winter_participants,
+            x="Games",
+            y="ID",
+            title="Antal italienska deltagare per OS - Vinter",
+            markers=True,
+            labels={"ID": "Antal deltagare"},
+        )
+
+    # ---- Figures: Fencing (Italy) ----
+
+    fencing_unique_medals = ita_medals_unique[
+        ita_medals_unique["Sport"] == "Fencing"
     ]
-    .drop_duplicates(subset=["Games", "Event", "Medal"])
-)
-
-medals_by_games_winter = (
-    ita_winter_unique
-    .groupby("Games")["Medal"]
-    .count()
-    .reset_index()
-)
-
-fig_medals_winter = px.line(
-    medals_by_games_winter,
-    x="Games",
-    y="Medal",
-    title="Medaljer per OS - Italien Vinter",
-    markers=True,
-)
-
-# 4) Age distribution of Italian athletes
-fig_age_hist = px.histogram(
-    ita,
-    x="Age",
-    nbins=30,
-    title="Åldersfördelning - Italienska OS-idrottare",
-    labels={"Age": "Ålder"},
-)
-
-# 5) Sex distribution pie chart
-fig_sex_pie = px.pie(
-    ita,
-    names="Sex",
-    title="Könsfördelning - Italien",
-)
-
-# 6) Number of Italian participants per Games (Summer & Winter)
-ita_summer_participants = (
-    ita[ita["Season"] == "Summer"]
-    .drop_duplicates(subset=["Games", "ID"])
-    .groupby("Games")["ID"]
-    .count()
-    .reset_index()
-)
-
-fig_summer_participants = px.line(
-    ita_summer_participants,
-    x="Games",
-    y="ID",
-    title="Antal italienska deltagare per OS - Sommar",
-    markers=True,
-    labels={"ID": "Antal deltagare"},
-)
-
-ita_winter_participants = (
-    ita[ita["Season"] == "Winter"]
-    .drop_duplicates(subset=["Games", "ID"])
-    .groupby("Games")["ID"]
-    .count()
-    .reset_index()
-)
-
-fig_winter_participants = px.line(
-    ita_winter_participants,
-    x="Games",
-    y="ID",
-    title="Antal italienska deltagare per OS - Vinter",
-    markers=True,
-    labels={"ID": "Antal deltagare"},
-)
-
-# ---- Figures: Fencing (Italy) ----
-
-fencing = ita[ita["Sport"] == "Fencing"].copy()
-
-fencing_unique_medals = (
-    fencing[fencing["Medal"] != "None"]
-    .drop_duplicates(subset=["Games", "Event", "Medal"])
-)
-
-# Medal types per year (Gold / Silver / Bronze stacked bar)
-medals_by_type = (
-    fencing_unique_medals
-    .pivot_table(
-        index="Year",
-        columns="Medal",
-        values="ID",
-        aggfunc="count",
-        fill_value=0,
+
+    # Medal types per year (Gold / Silver / Bronze stacked bar)
+    medal_types = ["Gold", "Silver", "Bronze"]
+
+    medals_by_type = (
+        fencing_unique_medals
+        .groupby(["Year", "Medal"], observed=True)
+        .size()
+        .unstack("Medal", fill_value=0)
+        .reindex(columns=medal_types, fill_value=0)
+        .reset_index()
+    )
+
+    @cached_fig("fig_fencing_medal_types", cache_key)
+    def fig_fencing_medal_types():
+        fig = px.bar(
+            medals_by_type,
+            x="Year",
+            y=medal_types,
+            title="Italy Fencing - Medals per Year",
+            labels={"value": "Number of Medals", "variable": "Medal Type"},
+            color_discrete_map={
+                "Gold": "#F6D411",
+                "Silver": "#D7D4D4",
+                "Bronze": "#CD7532",
+            },
+        )
+        fig.update_layout(barmode="stack")
+        return fig
+
+    # Total medals per year (line)
+    medals_by_type["Total"] = (
+        medals_by_type[medal_types].to_numpy().sum(axis=1)
+    )
+
+    @cached_fig("fig_fencing_total_medals", cache_key)
+    def fig_fencing_total_medals():
+        return px.line(
+            medals_by_type,
+            x="Year",
+            y="Total",
+            markers=True,
+            title="Italy Fencing - Total Medals per Year",
+            labels={"Total": "Total Medals"},
+        )
+
+    # Medals by fencing event (Italy)
+    medals_by_event = (
+        category_counts(fencing_unique_medals["Event"], "Medal")
+        .sort_values(ascending=False)
+        .reset_index()
     )
-    .reset_index()
-)
-
-fig_fencing_medal_types = px.bar(
-    medals_by_type,
-    x="Year",
-    y=["Gold", "Silver", "Bronze"],
-    title="Italy Fencing - Medals per Year",
-    labels={"value": "Number of Medals", "variable": "Medal Type"},
-    color_discrete_map={
-        "Gold": "#F6D411",
-        "Silver": "#D7D4D4",
-        "Bronze": "#CD7532",
-    },
-)
-fig_fencing_medal_types.update_layout(barmode="stack")
-
-# Total medals per year (line)
-medals_type_cols = [
-    c for c in medals_by_type.columns
-    if c in ["Gold", "Silver", "Bronze"]
-]
-medals_by_type["Total"] = medals_by_type[medals_type_cols].sum(axis=1)
-
-fig_fencing_total_medals = px.line(
-    medals_by_type,
-    x="Year",
-    y="Total",
-    markers=True,
-    title="Italy Fencing - Total Medals per Year",
-    labels={"Total": "Total Medals"},
-)
-
-# Medals by fencing event (Italy)
-medals_by_event = (
-    fencing_unique_medals
-    .groupby("Event")["Medal"]
-    .count()
-    .sort_values(ascending=False)
-    .reset_index()
-)
-
-fig_fencing_medals_by_event = px.bar(
-    medals_by_event,
-    x="Event",
-    y="Medal",
-    title="Italy Fencing - Medals per Event",
-    labels={"Medal": "Number of Medals", "Event": "Event"},
-)
-fig_fencing_medals_by_event.update_xaxes(tickangle=45)
-
-# ---- Figures: Fencing vs rest of the world / other sports ----
-
-# Fencing for all countries
-fencing_all = df[df["Sport"] == "Fencing"].copy()
-
-fencing_all_unique_medals = (
-    fencing_all[fencing_all["Medal"] != "None"]
-    .drop_duplicates(subset=["Games", "Event", "Medal"])
-)
-
-medals_country = (
-    fencing_all_unique_medals
-    .groupby("NOC")["Medal"]
-    .count()
-    .reset_index()
-    .sort_values("Medal", ascending=False)
-)
-
-fig_fencing_country_medals = px.bar(
-    medals_country.head(20),
-    x="NOC",
-    y="Medal",
-    title="Fencing - Medal Distribution by Country",
-    labels={"NOC": "Country", "Medal": "Number of Medals"},
-)
-
-# Age distribution: Fencing vs other Italian sports
-fencing_group = ita[ita["Sport"] == "Fencing"].copy()
-fencing_group["Group"] = "Fencing"
-
-other_sports = ita[ita["Sport"] != "Fencing"].copy()
-other_sports["Group"] = "Other sports"
-
-age_compare = pd.concat([fencing_group, other_sports], ignore_index=True)
-
-mean_age = (
-    age_compare.groupby("Group")["Age"]
-    .mean()
-    .reset_index()
-    .round(1)
-)
-
-fig_age_fencing_vs_others = px.histogram(
-    age_compare,
-    x="Age",
-    nbins=30,
-    histnorm="percent",
-    facet_row="Group",
-    title="Age Distribution - Fencing vs Other Italian Sports",
-    labels={"Age": "Age", "Group": "Group"},
-)
-fig_age_fencing_vs_others.update_layout(
-    height=700,
-    margin=dict(t=80, b=40),
-    font=dict(size=14),
-)
-fig_age_fencing_vs_others.update_xaxes(range=[10, 50])
-fig_age_fencing_vs_others.update_yaxes(matches=None)
-
-# ---- Dash app layout ----
+
+    @cached_fig("fig_fencing_medals_by_event", cache_key)
+    def fig_fencing_medals_by_event():
+        fig = px.bar(
+            medals_by_event,
+            x="Event",
+            y="Medal",
+            title="Italy Fencing - Medals per Event",
+            labels={"Medal": "Number of Medals", "Event": "Event"},
+        )
+        fig.update_xaxes(tickangle=45)
+        return fig
+
+    # ---- Figures: Fencing vs rest of the world / other sports ----
+
+    # Fencing for all countries
+    fencing_all = df.loc[fencing_mask]
+
+    # Distinct (Games, Event, Medal) per country in one composite-key
+    # groupby; team members collapse to one medal, shared medals count for
+    # every country that won them
+    country_medals = (
+        fencing_all[fencing_all["Medal"] != "None"]
+        .groupby(["NOC", "Games", "Event", "Medal"], observed=True, sort=False)
+        .size()
+        .reset_index()
+    )
+
+    medals_country = (
+        category_counts(country_medals["NOC"], "Medal")
+        .nlargest(20)
+        .reset_index()
+    )
+
+    @cached_fig("fig_fencing_country_medals", cache_key)
+    def fig_fencing_country_medals():
+        return px.bar(
+            medals_country,
+            x="NOC",
+            y="Medal",
+            title="Fencing - Medal Distribution by Country",
+            labels={"NOC": "Country", "Medal": "Number of Medals"},
+        )
+
+    # Age distribution: Fencing vs other Italian sports
+    # Label each Italian row with its group instead of splitting and
+    # concatenating copies of the frame
+    age_compare = ita.assign(
+        Group=pd.Categorical(
+            np.where(fencing_mask[ita_mask], "Fencing", "Other sports")
+        )
+    )
+
+    mean_age = (
+        age_compare.groupby("Group", observed=True)["Age"]
+        .mean()
+        .reset_index()
+        .round(1)
+    )
+
+    @cached_fig("fig_age_fencing_vs_others", cache_key)
+    def fig_age_fencing_vs_others():
+        fig = px.histogram(
+            age_compare,
+            x="Age",
+            nbins=30,
+            histnorm="percent",
+            facet_row="Group",
+            category_orders={"Group": ["Fencing", "Other sports"]},
+            title="Age Distribution - Fencing vs Other Italian Sports",
+            labels={"Age": "Age", "Group": "Group"},
+        )
+        fig.update_layout(
+            height=700,
+            margin=dict(t=80, b=40),
+            font=dict(size=14),
+        )
+        fig.update_xaxes(range=[10, 50])
+        fig.update_yaxes(matches=None)
+        return fig
+
+    # ---- Dash app layout ----
+
+    return html.Div(
+        style={"fontFamily": "Arial, sans-serif", "margin": "20px"},
+        children=[
+            html.H1(
+                "OS-analys: Italien & Fäktning",
+                style={"textAlign": "center"},
+            ),
+
+            html.H2("Italien – översikt"),
+            dcc.Graph(figure=fig_medals_by_sport),
+            dcc.Graph(figure=fig_participants_by_sport),
+            dcc.Graph(figure=fig_medals_summer),
+            dcc.Graph(figure=fig_medals_winter),
+            dcc.Graph(figure=fig_age_hist),
+            dcc.Graph(figure=fig_sex_pie),
+            dcc.Graph(figure=fig_summer_participants),
+            dcc.Graph(figure=fig_winter_participants),
+
+            html.H2("Fencing – Italien"),
+            dcc.Graph(figure=fig_fencing_medal_types),
+            dcc.Graph(figure=fig_fencing_total_medals),
+            dcc.Graph(figure=fig_fencing_medals_by_event),
+
+            html.H2("Fencing – internationellt"),
+            dcc.Graph(figure=fig_fencing_country_medals),
+
+            html.H2("Åldersjämförelse: Fäktning vs övriga sporter"),
+            dcc.Graph(figure=fig_age_fencing_vs_others),
+
+            html.H3("Medelålder per grupp"),
+            html.Ul(
+                [
+                    html.Li(f"{group}: {age} år")
+                    for group, age in zip(
+                        mean_age["Group"].tolist(), mean_age["Age"].tolist()
+                    )
+                ]
+            ),
+        ],
+    )
+
+
+# ---- Dash app ----
 
 app = dash.Dash(__name__)
 
-app.layout = html.Div(
-    style={"fontFamily": "Arial, sans-serif", "margin": "20px"},
-    children=[
-        html.H1("OS-analys: Italien & Fäktning", style={"textAlign": "center"}),
-
-        html.H2("Italien – översikt"),
-        dcc.Graph(figure=fig_medals_by_sport),
-        dcc.Graph(figure=fig_participants_by_sport),
-        dcc.Graph(figure=fig_medals_summer),
-        dcc.Graph(figure=fig_medals_winter),
-        dcc.Graph(figure=fig_age_hist),
-        dcc.Graph(figure=fig_sex_pie),
-        dcc.Graph(figure=fig_summer_participants),
-        dcc.Graph(figure=fig_winter_participants),
-
-        html.H2("Fencing – Italien"),
-        dcc.Graph(figure=fig_fencing_medal_types),
-        dcc.Graph(figure=fig_fencing_total_medals),
-        dcc.Graph(figure=fig_fencing_medals_by_event),
-
-        html.H2("Fencing – internationellt"),
-        dcc.Graph(figure=fig_fencing_country_medals),
-
-        html.H2("Åldersjämförelse: Fäktning vs övriga sporter"),
-        dcc.Graph(figure=fig_age_fencing_vs_others),
-
-        html.H3("Medelålder per grupp"),
-        html.Ul(
-            [
-                html.Li(f"{row['Group']}: {row['Age']} år")
-                for _, row in mean_age.iterrows()
-            ]
-        ),
-    ],
-)
+# WSGI entry point for gunicorn. Run with --preload so the layout is
+# built once before forking and shared by all workers.
+server = app.server
+
+DEBUG = True
+
+# The debug reloader runs this script twice: a watcher process that never
+# serves requests, and a child (WERKZEUG_RUN_MAIN=true) that does. Only
+# build the layout where it is served.
+if (
+    __name__ == "__main__"
+    and DEBUG
+    and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+):
+    app.layout = html.Div()
+else:
+    app.layout = build_layout()
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    app.run(debug=DEBUG)